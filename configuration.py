@@ -55,7 +55,20 @@ class VideoSearchConfiguration:
         self.whisper_model = os.getenv("WHISPER_MODEL", "base")
         self.embedding_dimension = int(os.getenv("EMBEDDING_DIMENSION", "1024"))
         self.index_file = os.getenv("INDEX_FILE", "video_index.faiss")
+        self.index_type = os.getenv("INDEX_TYPE", "fp16")
         self.chunk_duration = float(os.getenv("CHUNK_DURATION", "30.0"))
+        self.max_concurrent_extracts = int(os.getenv("MAX_CONCURRENT_EXTRACTS", "2"))
+
+class ServerConfiguration:
+    def __init__(self) -> None:
+        """Initialize HTTP server configuration with environment variables."""
+        load_dotenv()
+        self.x_accel_redirect_prefix = os.getenv("X_ACCEL_REDIRECT_PREFIX", "").rstrip("/")
+        self.host = os.getenv("HOST", "0.0.0.0")
+        self.port = int(os.getenv("PORT", "8567"))
+        self.workers = int(os.getenv("WORKERS", "1"))
+        self.cpu_workers = int(os.getenv("CPU_WORKERS", str(os.cpu_count() or 2)))
+        self.cors_origins = [origin.strip() for origin in os.getenv("CORS_ORIGINS", "*").split(",") if origin.strip()]
 
 # class AgentConfiguration:
 #     def __init__(self, config_path: str) -> None:
@@ -67,4 +80,5 @@ class VideoSearchConfiguration:
 llm_config = LLMConfiguration()
 code_llm_config = CodeLLMConfiguration()
 video_config = VideoSearchConfiguration()
+server_config = ServerConfiguration()
 cookie_file = "cookies.json"
@@ -39,4 +39,89 @@ async def emb(input, model='BAAI/bge-large-zh-v1.5', api_key=os.environ.get('sil
                 print(f"An error occurred: {e}")
                 continue
         return None
-    
\ No newline at end of file
+
+async def emb_batch(inputs, model='BAAI/bge-large-zh-v1.5', api_key=os.environ.get('siliconflow_api_key'), url=r"https://api.siliconflow.cn/v1/embeddings", max_retries=3):
+    # 批量请求：input传入字符串列表，一次API调用返回全部向量
+    payload = {
+        "model": model,
+        "input": inputs,
+        "encoding_format": "float"
+    }
+    # 设置请求头
+    headers = {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json"
+    }
+    async with aiohttp.ClientSession() as session:
+        for attempt in range(max_retries):
+            try:
+                print('正在发送批量embedding请求,数量:', len(inputs))
+                async with session.post(url, headers=headers, json=payload, timeout=30) as response:
+                    if response.status == 200:
+                        result = await response.json()
+                        # 按index字段排序，保证与输入顺序一致
+                        data = sorted(result['data'], key=lambda item: item['index'])
+                        return [item['embedding'] for item in data]
+                    else:
+                        # 处理非200状态码
+                        print(f"Request failed with status code {response.status}: {await response.text()}")
+                        continue
+            except asyncio.TimeoutError:
+                print("Request timed out.")
+                continue
+            except Exception as e:
+                print(f"An error occurred: {e}")
+                continue
+        return None
+
+
+class EmbeddingBatcher:
+    """
+    将短时间窗口内到达的多个嵌入请求合并为一次批量API调用
+    """
+    def __init__(self, max_wait: float = 0.008, max_batch_size: int = 32, max_concurrent_batches: int = 8):
+        # 等待更多请求加入批次的时间（秒）、单批最大数量、同时进行的批量请求数
+        self.max_wait = max_wait
+        self.max_batch_size = max_batch_size
+        self.max_concurrent_batches = max_concurrent_batches
+        self.pending = []  # (文本, Future) 列表
+        self.flush_task = None
+        self.batch_tasks = set()  # 进行中的批量请求，保留引用防止任务被回收
+        self.batch_semaphore = None
+
+    async def embed(self, text):
+        # 加入待处理队列，等待批次完成后取回自己的向量
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append((text, future))
+        if self.flush_task is None or self.flush_task.done():
+            self.flush_task = asyncio.create_task(self._flush())
+        return await future
+
+    async def _flush(self):
+        await asyncio.sleep(self.max_wait)
+        if self.batch_semaphore is None:
+            self.batch_semaphore = asyncio.Semaphore(self.max_concurrent_batches)
+        # 每个批次作为独立任务发送，慢请求不会阻塞后续批次
+        while self.pending:
+            batch = self.pending[:self.max_batch_size]
+            del self.pending[:self.max_batch_size]
+            task = asyncio.create_task(self._run_batch(batch))
+            self.batch_tasks.add(task)
+            task.add_done_callback(self.batch_tasks.discard)
+        self.flush_task = None
+
+    async def _run_batch(self, batch):
+        # 相同文本只请求一次
+        texts = list(dict.fromkeys(text for text, _ in batch))
+        try:
+            async with self.batch_semaphore:
+                embeddings = await emb_batch(texts)
+        except Exception as e:
+            # 与emb一致，失败时返回None
+            print(f"Batch embedding failed: {e}")
+            embeddings = None
+        results = dict(zip(texts, embeddings)) if embeddings and len(embeddings) == len(texts) else {}
+        for text, future in batch:
+            # 请求方可能已经取消（如客户端断开）
+            if not future.done():
+                future.set_result(results.get(text))
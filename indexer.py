@@ -1,9 +1,11 @@
 import faiss
 import numpy as np
+from cachetools import LRUCache
 from typing import List, Dict, Any, Optional
 import os
 import pickle
-from embedding import emb
+from embedding import emb, EmbeddingBatcher
+from file_lock import FileLock
 import asyncio
 
 
@@ -11,21 +13,32 @@ class VideoIndexer:
     """
     A class for indexing video transcription chunks using FAISS and embeddings.
     """
-    def __init__(self, dimension: int = 1024, index_file: Optional[str] = None):
+    def __init__(self, dimension: int = 1024, index_file: Optional[str] = None, query_cache_size: int = 4096, index_type: str = "fp16"):
         """
         Initialize the indexer.
 
         Args:
             dimension: Dimension of the embedding vectors
             index_file: Path to save/load the FAISS index
+            query_cache_size: Maximum number of query embeddings kept in the LRU cache
+            index_type: Vector storage, "fp16" (scalar quantized, half the memory bandwidth) or "flat" (float32)
         """
+        if index_type not in ("fp16", "flat"):
+            raise ValueError(f"Unsupported index type: {index_type}")
         self.dimension = dimension
+        self.index_type = index_type
         self.index_file = index_file or "video_index.faiss"
         self.metadata_file = self.index_file.replace('.faiss', '_metadata.pkl')
+        # Held by every worker process while it reads or writes the index files
+        self.file_lock = FileLock(self.index_file + '.lock')
 
         # Initialize FAISS index
-        self.index = faiss.IndexFlatIP(dimension)  # Inner product (cosine similarity with normalized vectors)
+        self.index = self._create_index()  # Inner product (cosine similarity with normalized vectors)
         self.metadata = []  # List of metadata for each vector
+        self.query_cache = LRUCache(maxsize=query_cache_size)  # query text -> normalized embedding
+        self.query_batcher = EmbeddingBatcher()  # Merges concurrent query embedding requests
+        self.version = 0  # Incremented whenever the index contents change
+        self.loaded_mtime = None  # Metadata file mtime when the index was last loaded/saved
 
         # Load existing index if available
         if os.path.exists(self.index_file) and os.path.exists(self.metadata_file):
@@ -60,22 +73,61 @@ class VideoIndexer:
         # Normalize vectors for cosine similarity
         faiss.normalize_L2(embeddings_array)
 
-        # Add to index
-        self.index.add(embeddings_array)
+        # Reloading, adding and saving block on the file lock and disk I/O, so run them off the event loop
+        await asyncio.to_thread(self._add_embeddings, embeddings_array, chunks, video_path)
 
-        # Add metadata
-        for i, chunk in enumerate(chunks):
-            metadata_entry = {
-                'video_path': video_path,
-                'start_time': chunk['start'],
-                'end_time': chunk['end'],
-                'text': chunk['text'],
-                'chunk_index': len(self.metadata) + i
-            }
-            self.metadata.append(metadata_entry)
+    def _add_embeddings(self, embeddings_array: np.ndarray, chunks: List[Dict[str, Any]], video_path: str):
+        """Append embedded chunks and save, holding the file lock so no other worker's save is lost."""
+        with self.file_lock:
+            # Pick up chunks saved by other worker processes right before appending
+            self.refresh()
 
-        # Save index
-        self.save_index()
+            # Add to a copy, so searches running meanwhile never see a half-updated index
+            index = faiss.clone_index(self.index)
+            index.add(embeddings_array)
+
+            # Add metadata
+            start = len(self.metadata)
+            metadata = self.metadata + [
+                {
+                    'video_path': video_path,
+                    'start_time': chunk['start'],
+                    'end_time': chunk['end'],
+                    'text': chunk['text'],
+                    'chunk_index': start + i
+                }
+                for i, chunk in enumerate(chunks)
+            ]
+
+            self.metadata = metadata
+            self.index = index
+
+            # Save index
+            self.save_index()
+            self.version += 1
+
+    async def embed_query(self, query: str) -> Optional[np.ndarray]:
+        """
+        Get the normalized embedding for a query, reusing cached embeddings.
+
+        Args:
+            query: Natural language query
+
+        Returns:
+            Normalized embedding vector, or None if the embedding request failed
+        """
+        query_array = self.query_cache.get(query)
+        if query_array is not None:
+            return query_array
+
+        query_embedding = await self.query_batcher.embed(query)
+        if not query_embedding:
+            return None
+
+        query_array = np.array([query_embedding], dtype=np.float32)
+        faiss.normalize_L2(query_array)
+        self.query_cache[query] = query_array[0]
+        return query_array[0]
 
     async def search(self, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
         """
@@ -89,36 +141,138 @@ class VideoIndexer:
             List of matching chunks with scores
         """
         # Get embedding for query
-        query_embedding = await emb(query)
-        if not query_embedding:
+        query_embedding = await self.embed_query(query)
+        if query_embedding is None:
             return []
 
-        query_array = np.array([query_embedding], dtype=np.float32)
-        faiss.normalize_L2(query_array)
+        return self.search_by_embedding(query_embedding, top_k)
+
+    def search_by_embedding(self, query_embedding: np.ndarray, top_k: int = 5) -> List[Dict[str, Any]]:
+        """
+        Search for similar chunks with a precomputed query embedding.
+
+        Args:
+            query_embedding: Normalized query embedding (see embed_query)
+            top_k: Number of top results to return
+
+        Returns:
+            List of matching chunks with scores
+        """
+        # A refresh or add in another thread may swap these, so search one consistent pair
+        index, metadata = self.index, self.metadata
+
+        # FAISS rejects k=0, which is what an empty index would give us
+        if index.ntotal == 0:
+            return []
+
+        # Vectors and query are L2-normalized, so inner product equals cosine similarity
+        query_array = query_embedding.reshape(1, -1)
 
         # Search
-        scores, indices = self.index.search(query_array, min(top_k, self.index.ntotal))
+        scores, indices = index.search(query_array, min(top_k, index.ntotal))
 
         results = []
         for score, idx in zip(scores[0], indices[0]):
-            if idx != -1 and idx < len(self.metadata):
-                result = self.metadata[idx].copy()
+            if idx != -1 and idx < len(metadata):
+                result = metadata[idx].copy()
                 result['score'] = float(score)
                 results.append(result)
 
         return results
 
     def save_index(self):
-        """Save the FAISS index and metadata to disk."""
-        faiss.write_index(self.index, self.index_file)
-        with open(self.metadata_file, 'wb') as f:
-            pickle.dump(self.metadata, f)
+        """
+        Save the FAISS index and metadata to disk.
+
+        Both files are written to temp paths and swapped in with os.replace, so other processes never
+        read a partially written file. The metadata file is replaced last and marks a completed save.
+        """
+        suffix = f".{os.getpid()}.tmp"
+        index_tmp = self.index_file + suffix
+        metadata_tmp = self.metadata_file + suffix
+        with self.file_lock:
+            try:
+                faiss.write_index(self.index, index_tmp)
+                os.replace(index_tmp, self.index_file)
+
+                with open(metadata_tmp, 'wb') as f:
+                    pickle.dump(self.metadata, f)
+                # os.replace keeps the mtime, so this is the mtime readers will see for our save
+                saved_mtime = os.stat(metadata_tmp).st_mtime_ns
+                os.replace(metadata_tmp, self.metadata_file)
+            finally:
+                for tmp in (index_tmp, metadata_tmp):
+                    if os.path.exists(tmp):
+                        os.remove(tmp)
+            self.loaded_mtime = saved_mtime
 
     def load_index(self):
         """Load the FAISS index and metadata from disk."""
-        self.index = faiss.read_index(self.index_file)
-        with open(self.metadata_file, 'rb') as f:
-            self.metadata = pickle.load(f)
+        # Saves hold the file lock, so the index and metadata read here always belong together
+        with self.file_lock:
+            mtime = self._get_saved_mtime()
+            with open(self.metadata_file, 'rb') as f:
+                metadata = pickle.load(f)
+            loaded_index = faiss.read_index(self.index_file)
+            index = self._convert_index(loaded_index)
+            # Searches in other threads may run meanwhile; metadata first, since search ignores
+            # vectors without metadata
+            self.metadata = metadata
+            self.index = index
+            self.loaded_mtime = mtime
+
+            # Persist a converted index once, so later loads and other workers skip the conversion
+            if index is not loaded_index:
+                self.save_index()
+
+    def _create_index(self):
+        """Create an empty inner-product index with the configured vector storage."""
+        if self.index_type == "flat":
+            return faiss.IndexFlatIP(self.dimension)
+        # fp16 scalar quantization needs no training and keeps recall close to float32
+        return faiss.IndexScalarQuantizer(self.dimension, faiss.ScalarQuantizer.QT_fp16, faiss.METRIC_INNER_PRODUCT)
+
+    def _convert_index(self, index):
+        """Convert a loaded index (e.g. one saved before the index type changed) to the configured storage."""
+        if self.index_type == "flat":
+            # IndexFlatL2 is also an IndexFlat, but it ranks by distance, not inner product
+            matches = isinstance(index, faiss.IndexFlatIP)
+        else:
+            matches = isinstance(index, faiss.IndexScalarQuantizer) and index.sq.qtype == faiss.ScalarQuantizer.QT_fp16
+        if matches:
+            return index
+
+        print(f"Converting index to {self.index_type} storage...")
+        converted = self._create_index()
+        if index.ntotal:
+            converted.add(index.reconstruct_n(0, index.ntotal))
+        return converted
+
+    def refresh(self) -> bool:
+        """
+        Reload the index if another process has saved a newer version to disk.
+
+        Returns:
+            True if the index was reloaded
+        """
+        # Cheap unlocked check first, this runs before every search
+        mtime = self._get_saved_mtime()
+        if mtime is None or mtime == self.loaded_mtime or not os.path.exists(self.index_file):
+            return False
+        with self.file_lock:
+            # Another thread may have reloaded while we waited for the lock
+            if self._get_saved_mtime() == self.loaded_mtime:
+                return False
+            self.load_index()
+            self.version += 1
+        return True
+
+    def _get_saved_mtime(self) -> Optional[int]:
+        """Get the mtime of the metadata file, which is written last by save_index."""
+        try:
+            return os.stat(self.metadata_file).st_mtime_ns
+        except OSError:
+            return None
 
     def get_index_info(self) -> Dict[str, Any]:
         """Get information about the current index."""
@@ -0,0 +1,72 @@
+import json
+import os
+import time
+from typing import Any, Dict, Optional
+from file_lock import FileLock
+
+
+class JobStore:
+    """
+    Background job state kept in a JSON file, so every worker process sees the same jobs.
+    """
+    def __init__(self, state_file: str, ttl: float = 3600, max_finished: int = 1000):
+        """
+        Initialize the job store.
+
+        Args:
+            state_file: Path of the JSON state file
+            ttl: Seconds a finished job is kept
+            max_finished: Maximum number of finished jobs kept, the oldest are dropped first
+        """
+        self.state_file = state_file
+        self.ttl = ttl
+        self.max_finished = max_finished
+        self.file_lock = FileLock(state_file + '.lock')
+
+    def create(self, job: Dict[str, Any]):
+        """Add a new job, pruning expired finished jobs first."""
+        with self.file_lock:
+            jobs = self._read()
+            self._prune(jobs)
+            jobs[job['job_id']] = job
+            self._write(jobs)
+
+    def update(self, job_id: str, **fields):
+        """Update fields of an existing job; unknown (e.g. pruned) jobs are ignored."""
+        with self.file_lock:
+            jobs = self._read()
+            if job_id not in jobs:
+                return
+            jobs[job_id].update(fields)
+            self._write(jobs)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Get a job by id, or None if it does not exist."""
+        # Writes swap the file in with os.replace, so reading without the lock is safe
+        return self._read().get(job_id)
+
+    def _prune(self, jobs: Dict[str, Dict[str, Any]]):
+        """Drop finished jobs past the TTL or over the limit, in creation order."""
+        now = time.time()
+        finished = [job_id for job_id, job in jobs.items() if job['finished_at'] is not None]
+        overflow = len(finished) - self.max_finished
+        for i, job_id in enumerate(finished):
+            if i < overflow or now - jobs[job_id]['finished_at'] > self.ttl:
+                del jobs[job_id]
+
+    def _read(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self.state_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def _write(self, jobs: Dict[str, Dict[str, Any]]):
+        tmp = f"{self.state_file}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(jobs, f, ensure_ascii=False)
+            os.replace(tmp, self.state_file)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
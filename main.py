@@ -1,33 +1,208 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, Query, Form
-from fastapi.responses import JSONResponse, HTMLResponse, FileResponse
+from fastapi import FastAPI, UploadFile, File, HTTPException, Query, Form, Request, Response, BackgroundTasks
+from fastapi.responses import ORJSONResponse, HTMLResponse, FileResponse
 from fastapi.middleware.cors import CORSMiddleware
 from typing import List, Dict, Any, Optional
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
 import os
-import shutil
-import tempfile
+import stat
+import time
+import uuid
 import asyncio
 from pathlib import Path
+from urllib.parse import quote
+from queue import SimpleQueue, Empty
+
+import aiofiles
+import anyio.to_thread
+from cachetools import TTLCache
 
 from video_search_tool import VideoSearchTool
-from configuration import video_config
+from query_cache import SemanticQueryCache
+from job_store import JobStore
+from configuration import video_config, server_config
+
+# CPU密集型任务（ffmpeg、Whisper转录）使用的有界线程池，以及全局搜索工具实例
+# 二者在lifespan中创建：模块可能被多次导入（python main.py、多worker子进程），
+# 放在模块顶层会重复加载Whisper模型和索引
+EXEC: Optional[ThreadPoolExecutor] = None
+video_tool: Optional[VideoSearchTool] = None
+
+# 客户端已断开连接时返回的状态码（与nginx一致）
+CLIENT_CLOSED_REQUEST = 499
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global EXEC, video_tool
+    EXEC = ThreadPoolExecutor(max_workers=server_config.cpu_workers)
+    video_tool = VideoSearchTool(executor=EXEC)
+    # 同时限制anyio默认线程池（同步依赖、文件读写等）的线程数
+    anyio.to_thread.current_default_thread_limiter().total_tokens = server_config.cpu_workers * 2
+    yield
+    EXEC.shutdown(wait=False, cancel_futures=True)
+
+# 默认使用orjson序列化响应，比标准库json更快
+app = FastAPI(
+    title="VedioS - 视频检索API",
+    description="基于FastAPI的视频上传和检索服务",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
+)
+
+# 支持上传的视频格式
+ALLOWED_EXTENSIONS = frozenset({".mp4", ".avi", ".mov", ".mkv", ".flv", ".wmv"})
 
-app = FastAPI(title="VedioS - 视频检索API", description="基于FastAPI的视频上传和检索服务")
+# 上传文件大小上限（500MB），以及multipart表单边界等额外开销的余量
+MAX_UPLOAD_SIZE = 500 * 1024 * 1024
+UPLOAD_FORM_OVERHEAD = 1024 * 1024
 
-# 添加CORS中间件，允许所有来源
+class UploadSizeLimitMiddleware:
+    """
+    在解析multipart表单之前按Content-Length拒绝过大的上传，避免整个请求体先落盘
+
+    纯ASGI中间件：只检查 POST /upload，其余请求（如视频流）直接透传，不经过额外的转发
+    """
+    def __init__(self, app, max_body_size: int):
+        self.app = app
+        self.max_body_size = max_body_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["method"] == "POST" and scope["path"] == "/upload":
+            for name, value in scope["headers"]:
+                if name == b"content-length":
+                    if value.isdigit() and int(value) > self.max_body_size:
+                        response = ORJSONResponse(content={"detail": "文件过大，最大支持500MB"}, status_code=413)
+                        await response(scope, receive, send)
+                        return
+                    break
+        await self.app(scope, receive, send)
+
+# 需在CORS中间件之前注册（位于其内层），使413响应同样带有CORS头
+app.add_middleware(UploadSizeLimitMiddleware, max_body_size=MAX_UPLOAD_SIZE + UPLOAD_FORM_OVERHEAD)
+
+# 添加CORS中间件，来源列表由CORS_ORIGINS配置（默认允许所有来源）
+# 通配来源时不允许携带凭据，避免任意站点以用户身份调用API
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],  # 允许所有来源
-    allow_credentials=True,
-    allow_methods=["*"],  # 允许所有HTTP方法
-    allow_headers=["*"],  # 允许所有头部
+    allow_origins=server_config.cors_origins,
+    allow_credentials="*" not in server_config.cors_origins,
+    allow_methods=["GET", "POST", "OPTIONS"],
+    allow_headers=["Content-Type", "Authorization"],
 )
 
-# 全局搜索工具实例
-video_tool = VideoSearchTool()
+# 限制同时运行的ffmpeg片段提取数量，避免CPU超额订阅
+EXTRACT_SEM = asyncio.Semaphore(video_config.max_concurrent_extracts)
 
 # 确保上传目录存在
 UPLOAD_DIR = Path("uploaded_videos")
 UPLOAD_DIR.mkdir(exist_ok=True)
+UPLOAD_ROOT = UPLOAD_DIR.resolve()
+
+# 上传文件流式写入的分块大小（1MB）
+UPLOAD_CHUNK_SIZE = 1 << 20
+
+# 上传写入缓冲区池，复用bytearray以减少大文件上传时的内存分配和GC压力
+_upload_buffer_pool = SimpleQueue()
+
+def _acquire_upload_buffer() -> bytearray:
+    """从缓冲区池中取出一个缓冲区，池为空时新建"""
+    try:
+        return _upload_buffer_pool.get_nowait()
+    except Empty:
+        return bytearray(UPLOAD_CHUNK_SIZE)
+
+# 搜索结果缓存：(查询, top_k) -> 格式化后的结果，5分钟过期，索引更新时清空
+_search_cache = TTLCache(maxsize=1024, ttl=300)
+# 语义缓存：查询向量余弦相似度 >= 0.95 时复用之前的结果
+_semantic_cache = SemanticQueryCache(video_config.embedding_dimension)
+# 上述缓存对应的索引版本；索引变化（包括其他worker写入）后缓存失效
+_cached_index_version = None
+
+# /index-info 结果缓存：(缓存时间, 索引信息)，短时间内的轮询直接返回
+INDEX_INFO_TTL = 2.0
+_index_info_cache = None
+
+# 正在进行的索引刷新检查，并发请求共用同一次检查
+_refresh_task: Optional[asyncio.Task] = None
+
+async def _refresh_index() -> int:
+    """检查其他worker是否更新了索引，返回当前索引版本"""
+    global _refresh_task
+    if _refresh_task is None or _refresh_task.done():
+        # 重新加载索引是阻塞的磁盘读取，放到线程中执行，避免阻塞事件循环；
+        # 使用默认线程池而非EXEC，以免排在耗时的转录任务之后
+        _refresh_task = asyncio.ensure_future(asyncio.to_thread(video_tool.refresh_index))
+    # shield：某个请求被取消时不影响其他等待同一次检查的请求
+    return await asyncio.shield(_refresh_task)
+
+async def _sync_search_caches():
+    """索引内容发生变化时清空搜索缓存"""
+    global _cached_index_version
+    index_version = await _refresh_index()
+    if index_version != _cached_index_version:
+        _search_cache.clear()
+        _semantic_cache.clear()
+        _cached_index_version = index_version
+
+# 后台索引任务状态保存在索引文件旁的JSON文件中，多worker时任一进程都能查询
+# 已结束的任务保留1小时，且最多保留1000个，超出后按创建顺序清理
+JOB_TTL = 3600
+MAX_FINISHED_JOBS = 1000
+JOBS = JobStore(
+    os.path.splitext(video_config.index_file)[0] + "_jobs.json",
+    ttl=JOB_TTL,
+    max_finished=MAX_FINISHED_JOBS
+)
+# 索引任务逐个执行，避免多个Whisper转录同时抢占CPU/内存
+_index_lock = asyncio.Lock()
+
+async def _index_job(job_id: str, video_path: str, chunk_duration: float, language: Optional[str]):
+    """在后台为已上传的视频建立索引，并更新任务状态"""
+    try:
+        async with _index_lock:
+            await asyncio.to_thread(JOBS.update, job_id, status="running", started_at=time.time())
+            print(f"开始处理视频: {video_path}")
+            result = await video_tool.index_video(
+                video_path,
+                chunk_duration=chunk_duration,
+                language=language
+            )
+        _invalidate_index_info()
+        await asyncio.to_thread(JOBS.update, job_id, status="completed", result=result, finished_at=time.time())
+    except Exception as e:
+        await asyncio.to_thread(
+            JOBS.update, job_id, status="failed", error=f"处理视频时出错: {str(e)}", finished_at=time.time()
+        )
+    except BaseException:
+        # 如服务关闭时任务被取消，同样标记为失败，避免状态一直停留在running
+        # 此时事件循环可能正在关闭，直接同步写入
+        JOBS.update(job_id, status="failed", error="索引任务被中断", finished_at=time.time())
+        raise
+
+def _invalidate_index_info():
+    """本进程更新索引后丢弃 /index-info 缓存"""
+    global _index_info_cache
+    _index_info_cache = None
+
+def _create_upload_file(filename: str, file_extension: str):
+    """
+    在上传目录中以O_EXCL方式创建文件，同名文件已存在时追加序号
+
+    返回 (文件描述符, 文件名, 文件路径)
+    """
+    # 只保留文件名部分，防止客户端通过文件名跳出上传目录
+    filename = Path(filename).name
+    name_without_ext = Path(filename).stem
+    final_filename = filename
+    counter = 1
+    while True:
+        final_path = UPLOAD_DIR / final_filename
+        try:
+            fd = os.open(final_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY | getattr(os, "O_BINARY", 0), 0o644)
+            return fd, final_filename, final_path
+        except FileExistsError:
+            final_filename = f"{name_without_ext}_{counter}{file_extension}"
+            counter += 1
 
 @app.get("/")
 async def root():
@@ -36,7 +211,8 @@ async def root():
         "message": "VedioS 视频检索API",
         "version": "1.0.0",
         "endpoints": {
-            "POST /upload": "上传视频文件并自动处理索引",
+            "POST /upload": "上传视频文件并在后台建立索引",
+            "GET /jobs/{job_id}": "查询后台索引任务状态",
             "GET /search": "基于自然语言查询检索视频片段",
             "GET /video/{filename}": "获取上传的视频文件",
             "GET /index-info": "获取索引信息",
@@ -46,85 +222,117 @@ async def root():
 
 @app.post("/upload")
 async def upload_video(
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     chunk_duration: float = Query(30.0, description="分块持续时间（秒）"),
     language: Optional[str] = Query(None, description="转录语言（可选，自动检测）")
 ):
     """
-    上传视频文件，自动处理并建立索引
+    上传视频文件，并在后台建立索引
+
+    立即返回202和任务ID，可通过 GET /jobs/{job_id} 查询索引进度
 
     - **file**: 视频文件（支持mp4、avi、mov等格式）
     - **chunk_duration**: 每个文本块的持续时间（秒）
     - **language**: 转录语言代码（可选）
     """
-    # 验证文件类型
-    allowed_extensions = {".mp4", ".avi", ".mov", ".mkv", ".flv", ".wmv"}
-    file_extension = Path(file.filename).suffix.lower()
+    # 验证文件类型（在任何文件I/O之前）；要求有文件名主体和扩展名（拒绝 "mp4"、".mp4"）
+    stem, dot, extension = os.path.basename(file.filename or "").rpartition(".")
+    file_extension = "." + extension.lower()
 
-    if file_extension not in allowed_extensions:
+    if not dot or not stem or file_extension not in ALLOWED_EXTENSIONS:
         raise HTTPException(
             status_code=400,
-            detail=f"不支持的文件格式。支持的格式：{', '.join(allowed_extensions)}"
+            detail=f"不支持的文件格式。支持的格式：{', '.join(sorted(ALLOWED_EXTENSIONS))}"
         )
 
     # 保存上传的文件
-    temp_file_path = None
+    partial_file_path = None
     try:
-        # 创建临时文件
-        with tempfile.NamedTemporaryFile(delete=False, suffix=file_extension) as temp_file:
-            shutil.copyfileobj(file.file, temp_file)
-            temp_file_path = temp_file.name
-
-        # 验证文件大小（限制为500MB）
-        file_size = os.path.getsize(temp_file_path)
-        if file_size > 500 * 1024 * 1024:  # 500MB
-            raise HTTPException(status_code=413, detail="文件过大，最大支持500MB")
-
-        # 移动到上传目录
-        final_filename = f"{file.filename}"
-        final_path = UPLOAD_DIR / final_filename
-        counter = 1
-        while final_path.exists():
-            name_without_ext = Path(file.filename).stem
-            final_filename = f"{name_without_ext}_{counter}{file_extension}"
-            final_path = UPLOAD_DIR / final_filename
-            counter += 1
-
-        shutil.move(temp_file_path, final_path)
-        temp_file_path = None
-
-        # 开始处理视频
-        print(f"开始处理视频: {final_path}")
-        result = await video_tool.index_video(
-            str(final_path),
-            chunk_duration=chunk_duration,
-            language=language
-        )
-
-        return JSONResponse(
+        # 原子地创建目标文件，并发上传同名文件时不会互相覆盖
+        fd, final_filename, final_path = _create_upload_file(file.filename, file_extension)
+        partial_file_path = final_path
+
+        # 直接写入上传目录（不经过临时文件），边写边统计文件大小
+        file_size = 0
+        buffer = _acquire_upload_buffer()
+        try:
+            view = memoryview(buffer)
+            async with aiofiles.open(fd, 'wb') as out_file:
+                # 读入复用的缓冲区，而不是每个分块分配新的bytes
+                while read_size := await asyncio.to_thread(file.file.readinto, view):
+                    file_size += read_size
+                    # 验证文件大小（限制为500MB）
+                    if file_size > MAX_UPLOAD_SIZE:
+                        raise HTTPException(status_code=413, detail="文件过大，最大支持500MB")
+                    await out_file.write(view[:read_size])
+        finally:
+            _upload_buffer_pool.put(buffer)
+        partial_file_path = None
+
+        # 登记索引任务，响应返回后在后台处理视频
+        job_id = uuid.uuid4().hex
+        await asyncio.to_thread(JOBS.create, {
+            "job_id": job_id,
+            "status": "queued",
+            "filename": final_filename,
+            "file_path": str(final_path),
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "result": None,
+            "error": None
+        })
+        background_tasks.add_task(_index_job, job_id, str(final_path), chunk_duration, language)
+
+        return ORJSONResponse(
             content={
                 "status": "success",
-                "message": "视频上传并索引成功",
+                "message": "视频上传成功，正在后台建立索引",
                 "data": {
                     "filename": final_filename,
                     "file_path": str(final_path),
                     "file_size": file_size,
-                    "indexing_result": result
+                    "job_id": job_id,
+                    "job_status": "queued"
                 }
             },
-            status_code=200
+            status_code=202
         )
 
     except Exception as e:
-        # 清理临时文件
-        if temp_file_path and os.path.exists(temp_file_path):
-            os.remove(temp_file_path)
+        # 清理未写完的文件
+        if partial_file_path:
+            partial_file_path.unlink(missing_ok=True)
+        # 保留413等已构造好的HTTP错误，不要包装成500
+        if isinstance(e, HTTPException):
+            raise
         raise HTTPException(status_code=500, detail=f"处理视频时出错: {str(e)}")
     finally:
         await file.close()
 
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """
+    查询后台索引任务状态
+
+    - **job_id**: 上传接口返回的任务ID
+    """
+    job = await asyncio.to_thread(JOBS.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="任务不存在")
+
+    return ORJSONResponse(
+        content={
+            "status": "success",
+            "job": job
+        },
+        status_code=200
+    )
+
 @app.get("/search")
 async def search_videos(
+    request: Request,
     q: str = Query(..., description="自然语言查询"),
     top_k: int = Query(5, description="返回结果数量", ge=1, le=20)
 ):
@@ -135,23 +343,44 @@ async def search_videos(
     - **top_k**: 返回的匹配结果数量
     """
     try:
-        results = await video_tool.search_videos(q, top_k=top_k)
-
-        # 格式化结果
-        formatted_results = []
-        for result in results:
-            formatted_result = {
-                "score": result["score"],
-                "text": result["text"],
-                "start_time": result["start_time"],
-                "end_time": result["end_time"],
-                "duration": result["end_time"] - result["start_time"],
-                "video_filename": Path(result["video_path"]).name,
-                "chunk_index": result["chunk_index"]
-            }
-            formatted_results.append(formatted_result)
-
-        return JSONResponse(
+        await _sync_search_caches()
+        cache_key = (q, top_k)
+        formatted_results = _search_cache.get(cache_key)
+        if formatted_results is None:
+            # 客户端已断开时不再发起嵌入请求
+            if await request.is_disconnected():
+                return Response(status_code=CLIENT_CLOSED_REQUEST)
+
+            # 查询向量在索引器中单独缓存，top_k 变化时只需重新检索
+            query_embedding = await video_tool.embed(q)
+            if query_embedding is None:
+                # 嵌入请求失败时不缓存空结果
+                formatted_results = []
+            else:
+                # 语义相近的查询直接复用之前的结果
+                formatted_results = _semantic_cache.lookup(query_embedding, top_k)
+                if formatted_results is None:
+                    results = video_tool.search_by_embedding(query_embedding, top_k=top_k)
+
+                    # 格式化结果
+                    formatted_results = [
+                        {
+                            "score": result["score"],
+                            "text": result["text"],
+                            "start_time": result["start_time"],
+                            "end_time": result["end_time"],
+                            "duration": result["end_time"] - result["start_time"],
+                            "video_filename": os.path.basename(result["video_path"]),
+                            "chunk_index": result["chunk_index"]
+                        }
+                        for result in results
+                    ]
+
+                    _semantic_cache.add(query_embedding, top_k, formatted_results)
+
+                _search_cache[cache_key] = formatted_results
+
+        return ORJSONResponse(
             content={
                 "status": "success",
                 "query": q,
@@ -167,9 +396,16 @@ async def search_videos(
 @app.get("/index-info")
 async def get_index_info():
     """获取当前索引的统计信息"""
+    global _index_info_cache
     try:
-        info = video_tool.get_index_info()
-        return JSONResponse(
+        if _index_info_cache and time.monotonic() - _index_info_cache[0] < INDEX_INFO_TTL:
+            info = _index_info_cache[1]
+        else:
+            # 缓存过期时才检查其他worker是否更新了索引
+            await _refresh_index()
+            info = video_tool.get_index_info()
+            _index_info_cache = (time.monotonic(), info)
+        return ORJSONResponse(
             content={
                 "status": "success",
                 "index_info": info
@@ -187,17 +423,31 @@ async def get_video(video_filename: str):
     - **video_filename**: 视频文件名
     """
     video_path = UPLOAD_DIR / video_filename
-    if not video_path.exists():
+    try:
+        stat_result = await asyncio.to_thread(os.stat, video_path)
+    except OSError:
+        raise HTTPException(status_code=404, detail="视频文件不存在")
+    if not stat.S_ISREG(stat_result.st_mode):
         raise HTTPException(status_code=404, detail="视频文件不存在")
 
+    # 配置了反向代理前缀时，交由nginx直接发送文件
+    if server_config.x_accel_redirect_prefix:
+        return Response(
+            media_type='video/mp4',
+            headers={"X-Accel-Redirect": f"{server_config.x_accel_redirect_prefix}/{quote(video_filename)}"}
+        )
+
+    # 传入stat_result，Starlette据此生成ETag/Last-Modified并支持Range请求
     return FileResponse(
         path=str(video_path),
         media_type='video/mp4',
-        filename=video_filename
+        filename=video_filename,
+        stat_result=stat_result
     )
 
 @app.post("/extract-segment")
 async def extract_segment(
+    request: Request,
     video_path: str = Form(..., description="视频文件路径"),
     start_time: float = Form(..., description="开始时间（秒）", ge=0),
     end_time: float = Form(..., description="结束时间（秒）", ge=0),
@@ -206,7 +456,7 @@ async def extract_segment(
     """
     提取视频片段
 
-    - **video_path**: 源视频文件路径
+    - **video_path**: 源视频文件名（在上传目录中查找，路径部分会被忽略）
     - **start_time**: 开始时间（秒）
     - **end_time**: 结束时间（秒）
     - **output_filename**: 输出文件名
@@ -214,20 +464,17 @@ async def extract_segment(
     if start_time >= end_time:
         raise HTTPException(status_code=400, detail="开始时间必须小于结束时间")
 
-    # 检查视频文件是否存在，如果不是绝对路径则在上传目录中查找
-    if not os.path.exists(video_path):
-        # 尝试在uploaded_videos目录中查找
-        potential_path = UPLOAD_DIR / video_path
-        if os.path.exists(str(potential_path)):
-            video_path = str(potential_path)
-        else:
-            # 再次尝试，如果video_path只包含文件名
-            filename_only = Path(video_path).name
-            potential_path = UPLOAD_DIR / filename_only
-            if os.path.exists(str(potential_path)):
-                video_path = str(potential_path)
-            else:
-                raise HTTPException(status_code=404, detail=f"视频文件不存在: {video_path} (尝试过: {potential_path})")
+    # 输出文件只取文件名，避免写到输出目录之外
+    output_filename = Path(output_filename).name
+    if output_filename in ("", ".", ".."):
+        raise HTTPException(status_code=400, detail="输出文件名无效")
+
+    # 只按文件名在上传目录中查找，一次检查即可，同时防止路径穿越（如 ../etc/passwd）
+    filename_only = Path(video_path).name
+    candidate = (UPLOAD_ROOT / filename_only).resolve()
+    if candidate.parent != UPLOAD_ROOT or not candidate.is_file():
+        raise HTTPException(status_code=404, detail=f"视频文件不存在: {video_path}")
+    video_path = str(UPLOAD_DIR / filename_only)
 
     # 确保输出目录存在
     output_dir = Path("extracted_segments")
@@ -235,13 +482,20 @@ async def extract_segment(
     output_path = output_dir / output_filename
 
     try:
-        video_tool.extract_segment(video_path, start_time, end_time, str(output_path))
+        # ffmpeg 为阻塞调用，放到线程池中执行以免阻塞事件循环
+        async with EXTRACT_SEM:
+            # 排队期间客户端可能已断开，此时不再启动ffmpeg
+            if await request.is_disconnected():
+                return Response(status_code=CLIENT_CLOSED_REQUEST)
+            await asyncio.get_running_loop().run_in_executor(
+                EXEC, video_tool.extract_segment, video_path, start_time, end_time, str(output_path)
+            )
 
         # 验证输出文件是否成功创建
         if not os.path.exists(str(output_path)):
             raise HTTPException(status_code=500, detail="输出文件未能成功创建")
 
-        return JSONResponse(
+        return ORJSONResponse(
             content={
                 "status": "success",
                 "message": "视频片段提取成功",
@@ -268,4 +522,14 @@ async def extract_segment(
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8567)
+    # 多worker需要以导入字符串方式加载应用，单worker直接传入app以免再次导入本模块
+    # 安装了uvloop/httptools时会自动启用
+    uvicorn.run(
+        app if server_config.workers == 1 else "main:app",
+        host=server_config.host,
+        port=server_config.port,
+        workers=server_config.workers,
+        loop="auto",
+        http="auto",
+        log_level="info"
+    )
@@ -0,0 +1,75 @@
+import faiss
+import numpy as np
+from typing import List, Dict, Any, Optional
+
+
+class SemanticQueryCache:
+    """
+    A cache of search results keyed by query embedding, so that paraphrased queries can reuse earlier results.
+    """
+    def __init__(self, dimension: int, threshold: float = 0.95, maxsize: int = 2048, neighbors: int = 4):
+        """
+        Initialize the cache.
+
+        Args:
+            dimension: Dimension of the query embedding vectors
+            threshold: Minimum cosine similarity for two queries to be treated as the same
+            maxsize: Maximum number of cached queries (oldest entries are evicted first)
+            neighbors: Number of nearest cached queries checked on lookup
+        """
+        self.dimension = dimension
+        self.threshold = threshold
+        self.maxsize = maxsize
+        self.neighbors = neighbors
+
+        self.index = faiss.IndexFlatIP(dimension)  # Inner product on normalized query embeddings
+        self.entries = []  # (top_k, results) for each vector in the index, oldest first
+
+    def lookup(self, query_embedding: np.ndarray, top_k: int) -> Optional[List[Dict[str, Any]]]:
+        """
+        Find cached results for a semantically equivalent query.
+
+        Args:
+            query_embedding: Normalized query embedding
+            top_k: Number of results requested
+
+        Returns:
+            Cached results, or None on a cache miss
+        """
+        if self.index.ntotal == 0:
+            return None
+
+        k = min(self.neighbors, self.index.ntotal)
+        scores, indices = self.index.search(query_embedding.reshape(1, -1), k)
+
+        for score, idx in zip(scores[0], indices[0]):
+            if idx == -1 or score < self.threshold:
+                break
+            cached_top_k, results = self.entries[idx]
+            # Results are sorted by score, so a larger cached top_k can be truncated
+            if cached_top_k >= top_k:
+                return results[:top_k]
+
+        return None
+
+    def add(self, query_embedding: np.ndarray, top_k: int, results: List[Dict[str, Any]]):
+        """
+        Cache the results for a query.
+
+        Args:
+            query_embedding: Normalized query embedding
+            top_k: Number of results that were requested
+            results: Results to cache
+        """
+        if self.index.ntotal >= self.maxsize:
+            # FIFO eviction; removing from a flat index shifts the remaining ids down by one
+            self.index.remove_ids(np.array([0], dtype=np.int64))
+            self.entries.pop(0)
+
+        self.index.add(query_embedding.reshape(1, -1))
+        self.entries.append((top_k, results))
+
+    def clear(self):
+        """Remove all cached queries."""
+        self.index.reset()
+        self.entries = []
@@ -0,0 +1,69 @@
+import asyncio
+import embedding
+from embedding import EmbeddingBatcher
+
+
+def test_batcher_keeps_order_and_dedups(monkeypatch):
+    """Each caller gets its own vector back and duplicate texts are requested once."""
+    calls = []
+
+    async def fake_emb_batch(texts):
+        calls.append(list(texts))
+        return [[float(len(text))] for text in texts]
+
+    monkeypatch.setattr(embedding, "emb_batch", fake_emb_batch)
+
+    async def run():
+        batcher = EmbeddingBatcher()
+        texts = ["a", "bb", "a", "ccc", "bb"]
+        return await asyncio.gather(*[batcher.embed(text) for text in texts])
+
+    results = asyncio.run(run())
+    assert results == [[1.0], [2.0], [1.0], [3.0], [2.0]]
+    assert calls == [["a", "bb", "ccc"]]
+
+
+def test_batcher_failure_returns_none(monkeypatch):
+    """A failed batch request resolves every waiting caller with None."""
+    async def failing_emb_batch(texts):
+        return None
+
+    async def raising_emb_batch(texts):
+        raise RuntimeError("boom")
+
+    async def run():
+        batcher = EmbeddingBatcher()
+        return await asyncio.gather(batcher.embed("a"), batcher.embed("b"))
+
+    monkeypatch.setattr(embedding, "emb_batch", failing_emb_batch)
+    assert asyncio.run(run()) == [None, None]
+
+    monkeypatch.setattr(embedding, "emb_batch", raising_emb_batch)
+    assert asyncio.run(run()) == [None, None]
+
+
+def test_batcher_runs_batches_concurrently(monkeypatch):
+    """Batches are sent in parallel instead of waiting for each other, up to max_concurrent_batches."""
+    in_flight = 0
+    peak = 0
+
+    async def slow_emb_batch(texts):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        try:
+            await asyncio.sleep(0.01)
+        finally:
+            in_flight -= 1
+        return [[0.0] for _ in texts]
+
+    monkeypatch.setattr(embedding, "emb_batch", slow_emb_batch)
+
+    async def run():
+        batcher = EmbeddingBatcher(max_batch_size=10, max_concurrent_batches=4)
+        return await asyncio.gather(*[batcher.embed(f"q{i}") for i in range(101)])
+
+    results = asyncio.run(run())
+    assert len(results) == 101 and all(result == [0.0] for result in results)
+    # 11 batches: several overlap, but never more than the semaphore allows
+    assert 1 < peak <= 4
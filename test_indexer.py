@@ -0,0 +1,60 @@
+import asyncio
+import faiss
+import numpy as np
+import indexer
+from indexer import VideoIndexer
+
+
+def _chunks(*texts):
+    return [{"start": float(i), "end": float(i + 1), "text": text} for i, text in enumerate(texts)]
+
+
+def test_concurrent_workers_keep_each_others_chunks(monkeypatch, tmp_path):
+    """A worker saving while another is still embedding must not drop either video."""
+    index_file = str(tmp_path / "video_index.faiss")
+    worker_a = VideoIndexer(dimension=8, index_file=index_file)
+    worker_b = VideoIndexer(dimension=8, index_file=index_file)
+
+    async def fake_emb(text):
+        # Worker B finishes a whole video while worker A is waiting on its first embedding
+        if text == "a1":
+            await worker_b.add_chunks(_chunks("b1", "b2"), "b.mp4")
+        return [1.0] * 8
+
+    monkeypatch.setattr(indexer, "emb", fake_emb)
+    asyncio.run(worker_a.add_chunks(_chunks("a1", "a2"), "a.mp4"))
+
+    reloaded = VideoIndexer(dimension=8, index_file=index_file)
+    for loaded in (worker_a, reloaded):
+        assert loaded.index.ntotal == 4
+        assert [entry["video_path"] for entry in loaded.metadata] == ["b.mp4", "b.mp4", "a.mp4", "a.mp4"]
+        assert [entry["chunk_index"] for entry in loaded.metadata] == [0, 1, 2, 3]
+
+
+def test_flat_index_reloads_as_fp16(monkeypatch, tmp_path):
+    """An index saved as flat is converted when reloaded as fp16 and still finds the same chunks."""
+    index_file = str(tmp_path / "video_index.faiss")
+    vectors = {f"t{i}": np.random.default_rng(i).standard_normal(8).tolist() for i in range(5)}
+
+    async def fake_emb(text):
+        return vectors[text]
+
+    monkeypatch.setattr(indexer, "emb", fake_emb)
+    flat = VideoIndexer(dimension=8, index_file=index_file, index_type="flat")
+    asyncio.run(flat.add_chunks(_chunks(*vectors), "v.mp4"))
+
+    fp16 = VideoIndexer(dimension=8, index_file=index_file, index_type="fp16")
+    assert isinstance(fp16.index, faiss.IndexScalarQuantizer)
+    # The converted index was saved, so the next load needs no conversion
+    assert isinstance(faiss.read_index(index_file), faiss.IndexScalarQuantizer)
+
+    for text in vectors:
+        query = np.array(vectors[text], dtype=np.float32)
+        query /= np.linalg.norm(query)
+        expected = flat.search_by_embedding(query, top_k=3)
+        results = fp16.search_by_embedding(query, top_k=3)
+        assert results[0]["text"] == text
+        # Same chunks in the same order with the same metadata; only the scores lose some precision
+        for result in expected + results:
+            result.pop("score")
+        assert results == expected
@@ -0,0 +1,36 @@
+import time
+from job_store import JobStore
+
+
+def _job(job_id, finished_at=None):
+    return {"job_id": job_id, "status": "queued", "finished_at": finished_at}
+
+
+def test_jobs_are_shared_between_stores(tmp_path):
+    """A job created through one worker's store can be read and updated through another's."""
+    state_file = str(tmp_path / "video_index_jobs.json")
+    worker_a = JobStore(state_file)
+    worker_b = JobStore(state_file)
+
+    worker_a.create(_job("a"))
+    worker_b.update("a", status="completed", result={"total_chunks": 3})
+    worker_b.update("missing", status="failed")
+
+    assert worker_a.get("a") == {"job_id": "a", "status": "completed", "finished_at": None, "result": {"total_chunks": 3}}
+    assert worker_a.get("missing") is None
+
+
+def test_create_prunes_expired_and_overflowing_jobs(tmp_path):
+    """Finished jobs past the TTL or over the limit are dropped oldest first; running jobs are kept."""
+    store = JobStore(str(tmp_path / "video_index_jobs.json"), ttl=60, max_finished=2)
+    now = time.time()
+    store.create(_job("expired", finished_at=now - 120))
+    store.create(_job("running"))
+    store.create(_job("old", finished_at=now))
+    store.create(_job("recent", finished_at=now))
+    store.create(_job("newest", finished_at=now))
+    store.create(_job("next"))
+
+    assert [job_id for job_id in ("expired", "running", "old", "recent", "newest", "next") if store.get(job_id)] == [
+        "running", "recent", "newest", "next"
+    ]
@@ -0,0 +1,41 @@
+import numpy as np
+from query_cache import SemanticQueryCache
+
+
+def _vector(*values):
+    vector = np.array(values, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def test_lookup_respects_similarity_threshold():
+    """A paraphrase above the threshold reuses the cached results, a less similar query misses."""
+    cache = SemanticQueryCache(4, threshold=0.95)
+    cache.add(_vector(1, 0, 0, 0), 5, ["cached"])
+
+    # cosine similarity ~0.98 and ~0.89
+    assert cache.lookup(_vector(1, 0.2, 0, 0), 5) == ["cached"]
+    assert cache.lookup(_vector(1, 0.5, 0, 0), 5) is None
+
+
+def test_lookup_truncates_larger_top_k_only():
+    """Results cached for a larger top_k are truncated; a larger request than cached misses."""
+    cache = SemanticQueryCache(4)
+    query = _vector(1, 0, 0, 0)
+    cache.add(query, 5, [1, 2, 3, 4, 5])
+
+    assert cache.lookup(query, 3) == [1, 2, 3]
+    assert cache.lookup(query, 5) == [1, 2, 3, 4, 5]
+    assert cache.lookup(query, 6) is None
+
+
+def test_fifo_eviction_keeps_ids_aligned_with_entries():
+    """Evicting the oldest query shifts the index ids, and lookups still return each query's own results."""
+    cache = SemanticQueryCache(4, maxsize=2)
+    cache.add(_vector(1, 0, 0, 0), 5, ["a"])
+    cache.add(_vector(0, 1, 0, 0), 5, ["b"])
+    cache.add(_vector(0, 0, 1, 0), 5, ["c"])
+
+    assert cache.index.ntotal == len(cache.entries) == 2
+    assert cache.lookup(_vector(1, 0, 0, 0), 5) is None
+    assert cache.lookup(_vector(0, 1, 0, 0), 5) == ["b"]
+    assert cache.lookup(_vector(0, 0, 1, 0), 5) == ["c"]
@@ -1,4 +1,5 @@
 import asyncio
+from concurrent.futures import Executor
 from typing import List, Dict, Any, Optional
 import os
 from video_processor import VideoProcessor
@@ -12,7 +13,7 @@ class VideoSearchTool:
     """
     A tool for searching video segments based on natural language queries using Whisper, FAISS, and FFmpeg.
     """
-    def __init__(self, whisper_model: Optional[str] = None, embedding_dimension: Optional[int] = None, index_file: Optional[str] = None):
+    def __init__(self, whisper_model: Optional[str] = None, embedding_dimension: Optional[int] = None, index_file: Optional[str] = None, executor: Optional[Executor] = None):
         """
         Initialize the video search tool.
 
@@ -20,6 +21,7 @@ class VideoSearchTool:
             whisper_model: Whisper model to use for transcription (uses config if None)
             embedding_dimension: Dimension of embedding vectors (uses config if None)
             index_file: Path to the FAISS index file (uses config if None)
+            executor: Executor for blocking FFmpeg/Whisper work (uses the event loop default if None)
         """
         whisper_model = whisper_model or video_config.whisper_model
         embedding_dimension = embedding_dimension or video_config.embedding_dimension
@@ -27,8 +29,9 @@ class VideoSearchTool:
 
         self.video_processor = VideoProcessor()
         self.transcriber = Transcriber(whisper_model)
-        self.indexer = VideoIndexer(embedding_dimension, index_file)
+        self.indexer = VideoIndexer(embedding_dimension, index_file, index_type=video_config.index_type)
         self.llm_conversation = LLMConversation()
+        self.executor = executor
 
     async def index_video(self, video_path: str, chunk_duration: float = 30.0, language: Optional[str] = None) -> Dict[str, Any]:
         """
@@ -44,13 +47,16 @@ class VideoSearchTool:
         """
         print(f"Indexing video: {video_path}")
 
+        # FFmpeg and Whisper are blocking, so run them in the executor to keep the event loop responsive
+        loop = asyncio.get_running_loop()
+
         # Extract audio
         print("Extracting audio...")
-        audio_path = self.video_processor.extract_audio(video_path)
+        audio_path = await loop.run_in_executor(self.executor, self.video_processor.extract_audio, video_path)
 
         # Transcribe audio
         print("Transcribing audio...")
-        transcription = self.transcriber.transcribe(audio_path, language)
+        transcription = await loop.run_in_executor(self.executor, self.transcriber.transcribe, audio_path, language)
 
         # Split into chunks
         print("Splitting into chunks...")
@@ -96,6 +102,31 @@ class VideoSearchTool:
 
         return enhanced_results
 
+    async def embed(self, query: str):
+        """
+        Get the normalized embedding for a query.
+
+        Args:
+            query: Natural language query
+
+        Returns:
+            Embedding vector, or None if the embedding request failed
+        """
+        return await self.indexer.embed_query(query)
+
+    def search_by_embedding(self, query_embedding, top_k: int = 5) -> List[Dict[str, Any]]:
+        """
+        Search for video segments with a precomputed query embedding.
+
+        Args:
+            query_embedding: Embedding returned by embed()
+            top_k: Number of results to return
+
+        Returns:
+            List of matching video segments
+        """
+        return self.indexer.search_by_embedding(query_embedding, top_k)
+
     def extract_segment(self, video_path: str, start_time: float, end_time: float, output_path: str):
         """
         Extract a video segment.
@@ -123,6 +154,16 @@ class VideoSearchTool:
         results = await self.search_videos(query, top_k)
         return results
 
+    def refresh_index(self) -> int:
+        """
+        Reload the index if it was updated on disk by another process.
+
+        Returns:
+            Current index version, which changes whenever the index contents change
+        """
+        self.indexer.refresh()
+        return self.indexer.version
+
     def get_index_info(self) -> Dict[str, Any]:
         """Get information about the current index."""
         return self.indexer.get_index_info()